@@ -1,17 +1,47 @@
 from fastapi import FastAPI, HTTPException, Depends, Query, status, Request
-from sqlalchemy import create_engine, Column, Integer, String
+from sqlalchemy import (
+    create_engine, event, inspect, func, select, update, lambda_stmt, table, column, asc, desc, DDL,
+    Column, Boolean, DateTime, Integer, String, Index, tuple_, and_, or_,
+)
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker, Session
-from pydantic import BaseModel, Field, validator
-from typing import Optional, List
-from datetime import datetime
-from fastapi.responses import HTMLResponse
+from sqlalchemy.orm import sessionmaker, Session, raiseload
+from pydantic import BaseModel, Field, validator, field_serializer
+from typing import Optional, List, Literal
+from datetime import datetime, timezone
+from fastapi.responses import HTMLResponse, ORJSONResponse
 from fastapi.templating import Jinja2Templates
+from jinja2 import FileSystemBytecodeCache
+import base64
+import binascii
+import json
 import os
+import re
+import threading
+import time
 
 # Database setup
 SQLALCHEMY_DATABASE_URL = "sqlite:///../lab.db"
-engine = create_engine(SQLALCHEMY_DATABASE_URL, connect_args={"check_same_thread": False})
+engine = create_engine(
+    SQLALCHEMY_DATABASE_URL,
+    connect_args={"check_same_thread": False},
+    pool_size=10,
+    max_overflow=20,
+)
+
+
+@event.listens_for(engine, "connect")
+def set_sqlite_pragmas(dbapi_connection, connection_record):
+    # WAL lets readers run alongside the writer; NORMAL sync is durable enough in WAL mode
+    cursor = dbapi_connection.cursor()
+    cursor.execute("PRAGMA journal_mode=WAL")
+    cursor.execute("PRAGMA synchronous=NORMAL")
+    cursor.execute("PRAGMA cache_size=-65536")
+    cursor.execute("PRAGMA temp_store=MEMORY")
+    cursor.execute("PRAGMA mmap_size=268435456")
+    cursor.execute("PRAGMA foreign_keys=ON")
+    cursor.close()
+
+
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 Base = declarative_base()
 
@@ -25,6 +55,39 @@ def get_db():
         db.close()
 
 
+# All timestamps are stored as naive UTC
+def utc_now() -> datetime:
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
+
+def to_utc_naive(v: datetime) -> datetime:
+    # Values with an offset are converted to UTC; values without one are taken as UTC
+    if v.tzinfo is not None:
+        return v.astimezone(timezone.utc).replace(tzinfo=None)
+    return v
+
+
+def parse_iso_datetime(v: str) -> datetime:
+    try:
+        if v.endswith('Z'):
+            return to_utc_naive(datetime.fromisoformat(v[:-1] + '+00:00'))
+        return to_utc_naive(datetime.fromisoformat(v))
+    except ValueError:
+        raise ValueError('Invalid ISO 8601 date format. Use: YYYY-MM-DDTHH:MM:SS')
+
+
+def normalize_due_date(v):
+    # Shared by TaskBase and TaskUpdate so both parse due_date the same way
+    if isinstance(v, str):
+        return parse_iso_datetime(v)
+    if isinstance(v, datetime):
+        return to_utc_naive(v)
+    # Numbers would otherwise be read as Unix timestamps by pydantic
+    if v is not None:
+        raise ValueError('Invalid ISO 8601 date format. Use: YYYY-MM-DDTHH:MM:SS')
+    return v
+
+
 # SQLAlchemy Model
 class Task(Base):
     __tablename__ = "tasks"
@@ -32,16 +95,259 @@ class Task(Base):
     id = Column(Integer, primary_key=True, index=True, autoincrement=True)
     title = Column(String, nullable=False)
     details = Column(String, nullable=True)
-    is_done = Column(Integer, default=0)
+    is_done = Column(Boolean, default=False, nullable=False)
     priority = Column(Integer, default=1)
-    due_date = Column(String, nullable=True)
-    created_at = Column(String, nullable=False)
-    updated_at = Column(String, nullable=True)
+    due_date = Column(DateTime, nullable=True)
+    # Filled in Python rather than with CURRENT_TIMESTAMP: SQLite compares DateTime values as
+    # strings, so stored values must use the same microsecond format as bound parameters
+    created_at = Column(DateTime, nullable=False, default=utc_now)
+    updated_at = Column(DateTime, nullable=True, onupdate=utc_now)
+
+    # Composite indexes for keyset pagination: (sort column, id)
+    # and for equality filters combined with the default created_at ordering
+    __table_args__ = (
+        Index("ix_tasks_created_at_id", "created_at", "id"),
+        Index("ix_tasks_due_date_id", "due_date", "id"),
+        Index("ix_tasks_priority_id", "priority", "id"),
+        Index("ix_tasks_done_created", "is_done", "created_at", "id"),
+        Index("ix_tasks_priority_created", "priority", "created_at", "id"),
+    )
+
+
+# Full-text index over title/details (FTS5 external content table kept in sync by triggers)
+TASKS_FTS_DDL = (
+    "CREATE VIRTUAL TABLE IF NOT EXISTS tasks_fts "
+    "USING fts5(title, details, content='tasks', content_rowid='id')",
+    "CREATE TRIGGER IF NOT EXISTS tasks_fts_ai AFTER INSERT ON tasks BEGIN "
+    "INSERT INTO tasks_fts(rowid, title, details) VALUES (new.id, new.title, new.details); "
+    "END",
+    "CREATE TRIGGER IF NOT EXISTS tasks_fts_ad AFTER DELETE ON tasks BEGIN "
+    "INSERT INTO tasks_fts(tasks_fts, rowid, title, details) VALUES ('delete', old.id, old.title, old.details); "
+    "END",
+    "CREATE TRIGGER IF NOT EXISTS tasks_fts_au AFTER UPDATE ON tasks BEGIN "
+    "INSERT INTO tasks_fts(tasks_fts, rowid, title, details) VALUES ('delete', old.id, old.title, old.details); "
+    "INSERT INTO tasks_fts(rowid, title, details) VALUES (new.id, new.title, new.details); "
+    "END",
+)
+
+tasks_fts = table("tasks_fts", column("rowid"), column("tasks_fts"))
+
+
+def create_tasks_fts(target, connection, **kw):
+    for statement in TASKS_FTS_DDL:
+        connection.exec_driver_sql(statement)
+
+
+event.listen(Task.__table__, "after_create", create_tasks_fts)
+event.listen(Task.__table__, "before_drop", DDL("DROP TABLE IF EXISTS tasks_fts"))
+
+
+def legacy_datetime(value: Optional[str]) -> Optional[datetime]:
+    if not value:
+        return None
+    try:
+        return parse_iso_datetime(value)
+    except ValueError:
+        return None
+
+
+def rebuild_legacy_tasks(connection):
+    # SQLite cannot alter column types or defaults, so the table is copied into the new schema.
+    # Timestamps go through Python so every legacy ISO variant ends up in the DateTime storage format.
+    for name in ("tasks_fts_ai", "tasks_fts_ad", "tasks_fts_au"):
+        connection.exec_driver_sql(f"DROP TRIGGER IF EXISTS {name}")
+    connection.exec_driver_sql("DROP TABLE IF EXISTS tasks_fts")
+    connection.exec_driver_sql("ALTER TABLE tasks RENAME TO tasks_legacy")
+    for index in inspect(connection).get_indexes("tasks_legacy"):
+        connection.exec_driver_sql(f"DROP INDEX {index['name']}")
+
+    Task.__table__.create(connection)
+    rows = connection.exec_driver_sql(
+        "SELECT id, title, details, is_done, priority, due_date, created_at, updated_at FROM tasks_legacy"
+    ).mappings().all()
+    if rows:
+        connection.execute(Task.__table__.insert(), [
+            {
+                **row,
+                "is_done": bool(row["is_done"]),
+                "due_date": legacy_datetime(row["due_date"]),
+                "created_at": legacy_datetime(row["created_at"]) or utc_now(),
+                "updated_at": legacy_datetime(row["updated_at"]),
+            }
+            for row in rows
+        ])
+    connection.exec_driver_sql("DROP TABLE tasks_legacy")
+
+
+def migrate_legacy_tasks(connection):
+    # Tables created before timestamps became DateTime store them as VARCHAR
+    created_at = next(c for c in inspect(connection).get_columns("tasks") if c["name"] == "created_at")
+    if not isinstance(created_at["type"], DateTime):
+        rebuild_legacy_tasks(connection)
 
 
 # Create tables
 Base.metadata.create_all(bind=engine)
 
+with engine.begin() as connection:
+    migrate_legacy_tasks(connection)
+
+# create_all() skips indexes of already existing tables
+for index in Task.__table__.indexes:
+    index.create(bind=engine, checkfirst=True)
+
+# Normalize is_done values written by the old Integer column
+with engine.begin() as connection:
+    connection.exec_driver_sql(
+        "UPDATE tasks SET is_done = (COALESCE(is_done, 0) != 0) "
+        "WHERE is_done IS NULL OR is_done NOT IN (0, 1)"
+    )
+
+# Databases created before full-text search need the index to be built once
+with engine.begin() as connection:
+    if not inspect(connection).has_table("tasks_fts"):
+        create_tasks_fts(Task.__table__, connection)
+        connection.exec_driver_sql("INSERT INTO tasks_fts(tasks_fts) VALUES ('rebuild')")
+
+
+def fts_match_query(q: str) -> Optional[str]:
+    # Every word becomes a quoted prefix term, so FTS5 query syntax is never exposed to clients
+    tokens = re.findall(r"\w+", q)
+    if not tokens:
+        return None
+    return " ".join(f'"{token}"*' for token in tokens)
+
+
+# Filters are appended as lambdas: SQLAlchemy caches the compiled statement per
+# combination of lambdas and only binds new parameter values on repeated calls
+def apply_task_filters(stmt, q=None, is_done=None, priority=None, due_before=None, due_after=None):
+    if q:
+        match = fts_match_query(q)
+        if match is None:
+            stmt += lambda s: s.where(Task.title.contains(q) | Task.details.contains(q))
+        else:
+            stmt += lambda s: s.where(
+                Task.id.in_(select(tasks_fts.c.rowid).where(tasks_fts.c.tasks_fts.match(match)))
+            )
+
+    if is_done is not None:
+        stmt += lambda s: s.where(Task.is_done == is_done)
+
+    if priority:
+        stmt += lambda s: s.where(Task.priority == priority)
+
+    if due_before:
+        stmt += lambda s: s.where(Task.due_date <= due_before)
+
+    if due_after:
+        stmt += lambda s: s.where(Task.due_date >= due_after)
+
+    return stmt
+
+
+# Total count cache for pagination metadata: filter key -> (timestamp, count),
+# kept in insertion order so the oldest entry is the first one
+COUNT_CACHE_TTL = 30
+COUNT_CACHE_MIN_ROWS = 1000
+COUNT_CACHE_MAX_SIZE = 256
+_count_cache = {}
+# Sync handlers run in the threadpool, so every cache access holds this lock
+_count_cache_lock = threading.Lock()
+
+
+def cached_count(db: Session, filter_key: tuple, use_cache: bool) -> int:
+    now = time.monotonic()
+    if use_cache:
+        with _count_cache_lock:
+            cached = _count_cache.get(filter_key)
+        if cached is not None and now - cached[0] < COUNT_CACHE_TTL:
+            return cached[1]
+
+    # The COUNT itself runs outside the lock so concurrent requests are not serialized
+    stmt = apply_task_filters(lambda_stmt(lambda: select(func.count(Task.id))), *filter_key)
+    total = db.execute(stmt).scalar()
+
+    # Small counts are cheap to recompute, so only large ones are cached
+    with _count_cache_lock:
+        _count_cache.pop(filter_key, None)
+        if total >= COUNT_CACHE_MIN_ROWS:
+            # Keys come from client input: drop expired entries and cap the size on every write
+            for key in [key for key, (ts, _) in _count_cache.items() if now - ts >= COUNT_CACHE_TTL]:
+                del _count_cache[key]
+            while len(_count_cache) >= COUNT_CACHE_MAX_SIZE:
+                del _count_cache[next(iter(_count_cache))]
+            _count_cache[filter_key] = (now, total)
+    return total
+
+
+# Keyset pagination helpers
+SQLITE_INT_MIN, SQLITE_INT_MAX = -2 ** 63, 2 ** 63 - 1
+
+
+def encode_cursor(value, task_id: int) -> str:
+    if isinstance(value, datetime):
+        value = value.isoformat()
+    payload = json.dumps({"v": value, "id": task_id})
+    return base64.urlsafe_b64encode(payload.encode()).decode()
+
+
+def is_sqlite_int(value) -> bool:
+    # SQLite integers are signed 64-bit; larger values overflow in the driver
+    return type(value) is int and SQLITE_INT_MIN <= value <= SQLITE_INT_MAX
+
+
+def decode_cursor(cursor: str, column):
+    invalid = HTTPException(status_code=400, detail="Invalid cursor parameter")
+    try:
+        payload = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+    except (binascii.Error, ValueError):
+        raise invalid
+
+    # Values are bound straight into SQL, so they must match the sort column's type
+    if not isinstance(payload, dict) or "v" not in payload or not is_sqlite_int(payload.get("id")):
+        raise invalid
+    value = payload["v"]
+    if value is None:
+        return None, payload["id"]
+
+    if isinstance(column.type, DateTime):
+        if not isinstance(value, str):
+            raise invalid
+        try:
+            value = datetime.fromisoformat(value)
+        except ValueError:
+            raise invalid
+    elif isinstance(column.type, Integer):
+        if not is_sqlite_int(value):
+            raise invalid
+    elif not isinstance(value, str):
+        raise invalid
+    return value, payload["id"]
+
+
+def apply_keyset_filter(stmt, column, order: str, last_value, last_id: int):
+    # SQLite puts NULLs first in ascending order and last in descending order
+    if order == "desc":
+        if last_value is None:
+            stmt += lambda s: s.where(and_(column.is_(None), Task.id < last_id))
+        else:
+            stmt += lambda s: s.where(
+                or_(tuple_(column, Task.id) < tuple_(last_value, last_id), column.is_(None))
+            )
+    elif last_value is None:
+        stmt += lambda s: s.where(or_(and_(column.is_(None), Task.id > last_id), column.isnot(None)))
+    else:
+        stmt += lambda s: s.where(tuple_(column, Task.id) > tuple_(last_value, last_id))
+    return stmt
+
+
+# Sorting dispatch tables for GET /tasks
+SORT_COLUMNS = {"created_at": Task.created_at, "due_date": Task.due_date, "priority": Task.priority}
+ORDER_FUNCS = {"asc": asc, "desc": desc}
+
+# Columns returned by GET /tasks; details are only loaded on request (?include=details)
+LIST_COLUMNS = (Task.id, Task.title, Task.is_done, Task.priority, Task.due_date, Task.created_at, Task.updated_at)
+
 
 # Pydantic Schemas with comprehensive validation
 class TaskBase(BaseModel):
@@ -49,7 +355,7 @@ class TaskBase(BaseModel):
     details: Optional[str] = Field(None, max_length=1000, description="Task details")
     is_done: bool = Field(False, description="Task completion status")
     priority: int = Field(default=1, ge=1, le=3, description="Priority: 1=Low, 2=Medium, 3=High")
-    due_date: Optional[str] = Field(None, description="Due date in ISO format")
+    due_date: Optional[datetime] = Field(None, description="Due date in ISO format")
 
     @validator('title')
     def validate_title(cls, v):
@@ -66,20 +372,9 @@ class TaskBase(BaseModel):
                 return None
         return v
 
-    @validator('due_date')
+    @validator('due_date', pre=True)
     def validate_due_date(cls, v):
-        if v is not None:
-            try:
-                datetime.fromisoformat(v.replace('Z', '+00:00'))
-            except ValueError:
-                raise ValueError('Invalid ISO 8601 date format. Use: YYYY-MM-DDTHH:MM:SS')
-        return v
-
-    @validator('priority')
-    def validate_priority(cls, v):
-        if v not in [1, 2, 3]:
-            raise ValueError('Priority must be 1 (low), 2 (medium) or 3 (high)')
-        return v
+        return normalize_due_date(v)
 
 
 class TaskCreate(TaskBase):
@@ -91,7 +386,7 @@ class TaskUpdate(BaseModel):
     details: Optional[str] = Field(None, max_length=1000)
     is_done: Optional[bool] = None
     priority: Optional[int] = Field(None, ge=1, le=3)
-    due_date: Optional[str] = None
+    due_date: Optional[datetime] = None
 
     @validator('title')
     def validate_title(cls, v):
@@ -101,34 +396,40 @@ class TaskUpdate(BaseModel):
                 raise ValueError('Title must be at least 3 characters long')
         return v
 
-    @validator('due_date')
+    @validator('due_date', pre=True)
     def validate_due_date(cls, v):
-        if v is not None:
-            try:
-                datetime.fromisoformat(v.replace('Z', '+00:00'))
-            except ValueError:
-                raise ValueError('Invalid ISO 8601 date format. Use: YYYY-MM-DDTHH:MM:SS')
-        return v
+        return normalize_due_date(v)
 
 
 class TaskResponse(TaskBase):
     id: int
-    created_at: str
-    updated_at: Optional[str] = None
+    created_at: datetime
+    updated_at: Optional[datetime] = None
 
     class Config:
         from_attributes = True
 
+    @field_serializer('due_date', 'created_at', 'updated_at')
+    def serialize_datetime(self, v: Optional[datetime]):
+        return v.isoformat() if v is not None else None
+
 
 # FastAPI App
 app = FastAPI(
     title="TODO List API",
     version="1.0.0",
-    description="A comprehensive TODO list application with FastAPI and SQLAlchemy ORM"
+    description="A comprehensive TODO list application with FastAPI and SQLAlchemy ORM",
+    default_response_class=ORJSONResponse
 )
 
-# Templates setup
-templates = Jinja2Templates(directory="templates")
+# Templates setup: templates are compiled once, without an mtime check on every render
+# (set TEMPLATES_AUTO_RELOAD=1 while editing templates)
+templates = Jinja2Templates(
+    directory="templates",
+    auto_reload=os.getenv("TEMPLATES_AUTO_RELOAD") == "1",
+    cache_size=400,
+    bytecode_cache=FileSystemBytecodeCache()
+)
 
 
 # Frontend routes
@@ -138,7 +439,7 @@ async def read_root(request: Request):
 
 
 @app.get("/tasks-page", response_class=HTMLResponse)
-async def read_tasks_page(
+def read_tasks_page(
         request: Request,
         db: Session = Depends(get_db),
         q: Optional[str] = Query(None),
@@ -146,18 +447,12 @@ async def read_tasks_page(
         priority: Optional[int] = Query(None, ge=1, le=3)
 ):
     # Build query with filters
-    query = db.query(Task)
-
-    if q:
-        query = query.filter(Task.title.contains(q) | Task.details.contains(q))
+    # raiseload('*') turns any future lazy relationship load into an error instead of N+1 queries;
+    # relationships the page needs must be opted in with selectinload()
+    stmt = apply_task_filters(lambda_stmt(lambda: select(Task).options(raiseload("*"))), q, is_done, priority)
+    stmt += lambda s: s.order_by(Task.created_at.desc())
 
-    if is_done is not None:
-        query = query.filter(Task.is_done == (1 if is_done else 0))
-
-    if priority:
-        query = query.filter(Task.priority == priority)
-
-    tasks = query.order_by(Task.created_at.desc()).all()
+    tasks = db.execute(stmt).scalars().all()
     return templates.TemplateResponse("tasks.html", {"request": request, "tasks": tasks})
 
 
@@ -172,121 +467,126 @@ async def health_check():
     return {"status": "ok"}
 
 
-@app.get("/tasks", response_model=List[TaskResponse])
-async def get_tasks(
+@app.get("/tasks", response_model=List[TaskResponse], response_class=ORJSONResponse)
+def get_tasks(
         db: Session = Depends(get_db),
         q: Optional[str] = Query(None, description="Search in title and details"),
         is_done: Optional[bool] = Query(None, description="Filter by completion status"),
         priority: Optional[int] = Query(None, ge=1, le=3, description="Filter by priority"),
         due_before: Optional[str] = Query(None, description="Tasks due before date"),
         due_after: Optional[str] = Query(None, description="Tasks due after date"),
-        sort: Optional[str] = Query("created_at", description="Sort by: created_at, due_date, priority"),
-        order: Optional[str] = Query("asc", description="Order: asc, desc"),
-        offset: Optional[int] = Query(0, ge=0, description="Pagination offset"),
-        limit: Optional[int] = Query(10, ge=1, le=100, description="Pagination limit")
+        sort: Literal["created_at", "due_date", "priority"] = Query("created_at", description="Sort by: created_at, due_date, priority"),
+        order: Literal["asc", "desc"] = Query("asc", description="Order: asc, desc"),
+        cursor: Optional[str] = Query(None, description="Pagination cursor returned in X-Next-Cursor header"),
+        offset: Optional[int] = Query(0, ge=0, description="Pagination offset (ignored when cursor is set)"),
+        limit: Optional[int] = Query(10, ge=1, le=100, description="Pagination limit"),
+        include: Optional[str] = Query(None, description="Extra fields to return: details")
 ):
-    # Validate sort parameter
-    if sort not in ["created_at", "due_date", "priority"]:
-        raise HTTPException(status_code=400, detail="Invalid sort parameter. Use: created_at, due_date, priority")
-
-    # Validate order parameter
-    if order not in ["asc", "desc"]:
-        raise HTTPException(status_code=400, detail="Invalid order parameter. Use: asc, desc")
-
-    # Build query
-    query = db.query(Task)
+    # Build query: list views select only the columns they return
+    include_details = bool(include) and "details" in include.split(",")
+    if include_details:
+        stmt = lambda_stmt(lambda: select(*LIST_COLUMNS, Task.details))
+    else:
+        stmt = lambda_stmt(lambda: select(*LIST_COLUMNS))
 
     # Apply filters
-    if q:
-        query = query.filter(Task.title.contains(q) | Task.details.contains(q))
-
-    if is_done is not None:
-        query = query.filter(Task.is_done == (1 if is_done else 0))
-
-    if priority:
-        query = query.filter(Task.priority == priority)
-
-    if due_before:
-        query = query.filter(Task.due_date <= due_before)
+    # Parsed like due_date in the request body, so date-only values are accepted too
+    try:
+        due_before = parse_iso_datetime(due_before) if due_before else None
+        due_after = parse_iso_datetime(due_after) if due_after else None
+    except ValueError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+    filter_key = (q, is_done, priority, due_before, due_after)
+    stmt = apply_task_filters(stmt, *filter_key)
 
-    if due_after:
-        query = query.filter(Task.due_date >= due_after)
+    # Total count: first page refreshes it, next pages may reuse the cached value
+    total = cached_count(db, filter_key, use_cache=bool(cursor or offset))
+    headers = {"X-Total-Count": str(total)}
 
     # Apply sorting
-    if sort == "created_at":
-        order_by_field = Task.created_at
-    elif sort == "due_date":
-        order_by_field = Task.due_date
-    else:  # priority
-        order_by_field = Task.priority
-
-    if order == "desc":
-        query = query.order_by(order_by_field.desc())
-    else:
-        query = query.order_by(order_by_field.asc())
-
-    # Apply pagination
-    tasks = query.offset(offset).limit(limit).all()
-
-    return tasks
+    order_by_field, order_func = SORT_COLUMNS[sort], ORDER_FUNCS[order]
+    sort_clause, id_clause = order_func(order_by_field), order_func(Task.id)
+    stmt += lambda s: s.order_by(sort_clause, id_clause)
+
+    # Apply pagination: seek past the cursor instead of scanning offset rows
+    if cursor:
+        last_value, last_id = decode_cursor(cursor, order_by_field)
+        stmt = apply_keyset_filter(stmt, order_by_field, order, last_value, last_id)
+    elif offset:
+        stmt += lambda s: s.offset(offset)
+
+    # Fetch one extra row to know whether there is a next page
+    fetch_limit = limit + 1
+    stmt += lambda s: s.limit(fetch_limit)
+    tasks = db.execute(stmt).all()
+    if len(tasks) > limit:
+        tasks = tasks[:limit]
+        last_task = tasks[-1]
+        headers["X-Next-Cursor"] = encode_cursor(getattr(last_task, sort), last_task.id)
+
+    # Rows come from the database in canonical form: skip validation here
+    # and return the response directly so FastAPI does not validate them again
+    tasks = [TaskResponse.model_construct(**row._mapping) for row in tasks]
+    # Without ?include=details the key is left out rather than reported as null
+    exclude = None if include_details else {"details"}
+    return ORJSONResponse(content=[task.model_dump(exclude=exclude) for task in tasks], headers=headers)
 
 
 @app.get("/tasks/{task_id}", response_model=TaskResponse)
-async def get_task(task_id: int, db: Session = Depends(get_db)):
-    task = db.query(Task).filter(Task.id == task_id).first()
+def get_task(task_id: int, db: Session = Depends(get_db)):
+    task = db.get(Task, task_id)
     if not task:
         raise HTTPException(status_code=404, detail="Task not found")
-    return task
+
+    task = TaskResponse.model_construct(**{c.name: getattr(task, c.name) for c in Task.__table__.columns})
+    return ORJSONResponse(content=task.model_dump())
 
 
 @app.post("/tasks", response_model=TaskResponse, status_code=status.HTTP_201_CREATED)
-async def create_task(task: TaskCreate, db: Session = Depends(get_db)):
+def create_task(task: TaskCreate, db: Session = Depends(get_db)):
     # Pydantic автоматически валидирует данные
-    now = datetime.now().isoformat()
     db_task = Task(
         title=task.title,
         details=task.details,
-        is_done=1 if task.is_done else 0,
+        is_done=task.is_done,
         priority=task.priority,
         due_date=task.due_date,
-        created_at=now,
         updated_at=None
     )
 
+    # flush() runs the INSERT and every column value is already known in Python,
+    # so the response is built without a SELECT; it has to happen before commit() expires the instance
     db.add(db_task)
+    db.flush()
+    created = TaskResponse.model_validate(db_task)
     db.commit()
-    db.refresh(db_task)
 
-    return db_task
+    return created
 
 
 @app.put("/tasks/{task_id}", response_model=TaskResponse)
-async def update_task(task_id: int, task_update: TaskUpdate, db: Session = Depends(get_db)):
-    db_task = db.query(Task).filter(Task.id == task_id).first()
-    if not db_task:
-        raise HTTPException(status_code=404, detail="Task not found")
-
+def update_task(task_id: int, task_update: TaskUpdate, db: Session = Depends(get_db)):
     # Pydantic автоматически валидирует данные
     update_data = task_update.dict(exclude_unset=True)
+    # is_done is NOT NULL: an explicit null leaves the stored value unchanged
+    if update_data.get("is_done", False) is None:
+        del update_data["is_done"]
+
+    # Single UPDATE ... RETURNING; updated_at is set by the column's onupdate
+    stmt = update(Task).where(Task.id == task_id).values(**update_data).returning(Task)
+    db_task = db.execute(stmt).scalar_one_or_none()
+    if db_task is None:
+        raise HTTPException(status_code=404, detail="Task not found")
 
-    # Update fields
-    for field, value in update_data.items():
-        if field == 'is_done':
-            setattr(db_task, field, 1 if value else 0)
-        else:
-            setattr(db_task, field, value)
-
-    db_task.updated_at = datetime.now().isoformat()
-
+    updated = TaskResponse.model_validate(db_task)
     db.commit()
-    db.refresh(db_task)
 
-    return db_task
+    return updated
 
 
 @app.delete("/tasks/{task_id}", status_code=status.HTTP_204_NO_CONTENT)
-async def delete_task(task_id: int, db: Session = Depends(get_db)):
-    db_task = db.query(Task).filter(Task.id == task_id).first()
+def delete_task(task_id: int, db: Session = Depends(get_db)):
+    db_task = db.get(Task, task_id)
     if not db_task:
         raise HTTPException(status_code=404, detail="Task not found")
 
@@ -1,26 +1,19 @@
-import subprocess
 import sys
 
+import pytest
+
 
 def run_tests():
-    """Запуск тестов через subprocess"""
+    """Запуск тестов через pytest.main в текущем процессе"""
     try:
-        result = subprocess.run([
-            sys.executable, "-m", "pytest",
+        return_code = pytest.main([
             "tests/tests_tasks_api.py",
             "-v",
             "--tb=short"
-        ], capture_output=True, text=True)
-
-        print("STDOUT:")
-        print(result.stdout)
-
-        if result.stderr:
-            print("STDERR:")
-            print(result.stderr)
+        ])
 
-        print(f"Return code: {result.returncode}")
-        return result.returncode
+        print(f"Return code: {int(return_code)}")
+        return return_code
 
     except Exception as e:
         print(f"Error running tests: {e}")
@@ -30,4 +23,4 @@ def run_tests():
 if __name__ == "__main__":
     print("🚀 Запуск тестов TODO List API...")
     exit_code = run_tests()
-    sys.exit(exit_code)
\ No newline at end of file
+    sys.exit(exit_code)
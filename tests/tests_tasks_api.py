@@ -1,30 +1,26 @@
-from sqlalchemy.orm import DeclarativeBase
-
-class Base(DeclarativeBase):
-    pass
-from sqlalchemy.orm import DeclarativeBase
-
-class Base(DeclarativeBase):
-    pass
-
 import pytest
 from fastapi.testclient import TestClient
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, event, text
 from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
 from sqlalchemy.ext.declarative import declarative_base
+import base64
+import json
 import os
 import sys
+import threading
 from datetime import datetime, timedelta
 
 # Правильно добавляем путь к app
 sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
 
+import app.app_orm as app_orm
 from app.app_orm import app, get_db, Base, Task
 
-# Тестовая база данных
-TEST_DATABASE_URL = "sqlite:///./test.db"
+# Тестовая база данных в памяти: StaticPool отдает всем сессиям одно соединение
+TEST_DATABASE_URL = "sqlite://"
 
-engine = create_engine(TEST_DATABASE_URL, connect_args={"check_same_thread": False})
+engine = create_engine(TEST_DATABASE_URL, connect_args={"check_same_thread": False}, poolclass=StaticPool)
 TestingSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
 
@@ -41,16 +37,22 @@ app.dependency_overrides[get_db] = override_get_db
 client = TestClient(app)
 
 
-@pytest.fixture(autouse=True)
-def setup_database():
-    """Создаем и очищаем таблицы перед каждым тестом"""
-    # Создаем все таблицы
+@pytest.fixture(scope="session", autouse=True)
+def create_tables():
+    """Создаем таблицы один раз на всю сессию тестов"""
     Base.metadata.create_all(bind=engine)
     yield
-    # Очищаем после теста
     Base.metadata.drop_all(bind=engine)
 
 
+@pytest.fixture(autouse=True)
+def setup_database():
+    """Очищаем таблицу задач после каждого теста"""
+    yield
+    with engine.begin() as connection:
+        connection.execute(text("DELETE FROM tasks"))
+
+
 # Фикстуры для тестовых данных
 @pytest.fixture
 def sample_task_data():
@@ -63,6 +65,19 @@ def sample_task_data():
     }
 
 
+@pytest.fixture
+def sql_statements():
+    """Список SQL-запросов, выполненных тестовой базой во время теста"""
+    statements = []
+
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    event.listen(engine, "before_cursor_execute", before_cursor_execute)
+    yield statements
+    event.remove(engine, "before_cursor_execute", before_cursor_execute)
+
+
 @pytest.fixture
 def created_task(sample_task_data):
     response = client.post("/tasks", json=sample_task_data)
@@ -119,6 +134,24 @@ class TestCreateTask:
         assert data["details"] is None  # default
         assert data["due_date"] is None  # default
 
+    def test_create_task_single_round_trip(self, sample_task_data, sql_statements):
+        response = client.post("/tasks", json=sample_task_data)
+        assert response.status_code == 201
+        assert response.json()["created_at"] is not None
+
+        # Один INSERT без повторного SELECT
+        assert len(sql_statements) == 1
+        assert sql_statements[0].startswith("INSERT INTO tasks")
+
+    def test_create_task_due_date_with_offset_stored_as_utc(self):
+        response = client.post("/tasks", json={"title": "Test task", "due_date": "2025-01-01T05:00:00+05:00"})
+        assert response.status_code == 201
+        assert response.json()["due_date"] == "2025-01-01T00:00:00"
+
+        # POST и GET возвращают одно и то же значение (UTC без смещения)
+        response = client.get(f"/tasks/{response.json()['id']}")
+        assert response.json()["due_date"] == "2025-01-01T00:00:00"
+
     def test_create_task_short_title(self):
         response = client.post("/tasks", json={"title": "ab"})
         assert response.status_code == 422  # FastAPI validation error
@@ -144,6 +177,14 @@ class TestCreateTask:
         })
         assert response.status_code == 422  # FastAPI validation error
 
+    def test_create_task_numeric_due_date(self):
+        response = client.post("/tasks", json={"title": "Test task", "due_date": 1700000000})
+        assert response.status_code == 422  # FastAPI validation error
+
+        response = client.post("/tasks", json={"title": "Test task"})
+        response = client.put(f"/tasks/{response.json()['id']}", json={"due_date": 1700000000})
+        assert response.status_code == 422
+
     def test_create_task_empty_title(self):
         response = client.post("/tasks", json={"title": "   "})
         assert response.status_code == 422  # FastAPI validation error
@@ -165,6 +206,15 @@ class TestGetTasks:
         assert data[0]["title"] == created_task["title"]
         assert data[0]["id"] == created_task["id"]
 
+    def test_get_tasks_details_only_on_request(self, created_task):
+        response = client.get("/tasks")
+        assert response.status_code == 200
+        assert "details" not in response.json()[0]
+
+        response = client.get("/tasks?include=details")
+        assert response.status_code == 200
+        assert response.json()[0]["details"] == created_task["details"]
+
     def test_get_tasks_filter_by_status_done(self):
         # Создаем выполненные и невыполненные задачи
         client.post("/tasks", json={"title": "Done task", "is_done": True})
@@ -221,12 +271,76 @@ class TestGetTasks:
         assert "milk" in data[0]["title"].lower()
 
         # Поиск в details
-        response = client.get("/tasks?q=programming")
+        response = client.get("/tasks?q=programming&include=details")
         assert response.status_code == 200
         data = response.json()
         assert len(data) == 1
         assert "programming" in data[0]["details"].lower()
 
+    def test_get_tasks_search_follows_updates_and_deletes(self):
+        task = client.post("/tasks", json={"title": "Buy milk"}).json()
+        client.post("/tasks", json={"title": "Buy bread"})
+
+        # Поиск по нескольким словам и по префиксу
+        response = client.get("/tasks?q=buy mil")
+        assert [t["id"] for t in response.json()] == [task["id"]]
+
+        client.put(f"/tasks/{task['id']}", json={"title": "Buy juice"})
+        assert client.get("/tasks?q=milk").json() == []
+        assert len(client.get("/tasks?q=juice").json()) == 1
+
+        client.delete(f"/tasks/{task['id']}")
+        assert client.get("/tasks?q=juice").json() == []
+
+    def test_get_tasks_search_without_words(self):
+        client.post("/tasks", json={"title": "Call +7 ***"})
+        client.post("/tasks", json={"title": "Learn Python"})
+
+        response = client.get("/tasks?q=***")
+        assert response.status_code == 200
+        data = response.json()
+        assert len(data) == 1
+        assert data[0]["title"] == "Call +7 ***"
+
+    def test_get_tasks_filter_by_due_date_range(self):
+        client.post("/tasks", json={"title": "January", "due_date": "2025-01-15T12:00:00"})
+        client.post("/tasks", json={"title": "March", "due_date": "2025-03-15T12:00:00"})
+        client.post("/tasks", json={"title": "No deadline"})
+
+        response = client.get("/tasks?due_after=2025-01-01T00:00:00&due_before=2025-02-01T00:00:00")
+        assert response.status_code == 200
+        data = response.json()
+        assert len(data) == 1
+        assert data[0]["title"] == "January"
+        assert data[0]["due_date"] == "2025-01-15T12:00:00"
+
+    def test_get_tasks_filter_by_due_date_with_offset(self):
+        client.post("/tasks", json={"title": "Morning", "due_date": "2025-01-01T06:00:00Z"})
+        client.post("/tasks", json={"title": "Evening", "due_date": "2025-01-01T18:00:00Z"})
+
+        response = client.get("/tasks", params={"due_before": "2025-01-01T12:00:00Z"})
+        assert [t["title"] for t in response.json()] == ["Morning"]
+
+        # 2025-01-01T15:00:00+05:00 == 2025-01-01T10:00:00 UTC
+        response = client.get("/tasks", params={"due_after": "2025-01-01T15:00:00+05:00"})
+        assert [t["title"] for t in response.json()] == ["Evening"]
+
+    def test_get_tasks_filter_by_date_only(self):
+        client.post("/tasks", json={"title": "January 1", "due_date": "2025-01-01T12:00:00"})
+        client.post("/tasks", json={"title": "January 2", "due_date": "2025-01-02"})
+        client.post("/tasks", json={"title": "January 3", "due_date": "2025-01-03T12:00:00"})
+
+        # Дата без времени трактуется как полночь UTC, как и в теле запроса
+        response = client.get("/tasks?due_after=2025-01-02")
+        assert response.status_code == 200
+        assert [t["title"] for t in response.json()] == ["January 2", "January 3"]
+
+        response = client.get("/tasks?due_before=2025-01-02")
+        assert [t["title"] for t in response.json()] == ["January 1", "January 2"]
+
+        response = client.get("/tasks?due_before=not-a-date")
+        assert response.status_code == 422
+
     def test_get_tasks_pagination(self):
         # Создаем несколько задач
         for i in range(5):
@@ -244,19 +358,208 @@ class TestGetTasks:
         data = response.json()
         assert len(data) == 2
 
+    def test_get_tasks_cursor_pagination(self):
+        for i in range(5):
+            client.post("/tasks", json={"title": f"Task {i + 1}", "priority": i % 2 + 1})
+
+        # Проходим все страницы по курсору
+        seen = []
+        response = client.get("/tasks?sort=priority&order=desc&limit=2")
+        while True:
+            assert response.status_code == 200
+            seen.extend(task["id"] for task in response.json())
+            cursor = response.headers.get("X-Next-Cursor")
+            if cursor is None:
+                break
+            response = client.get(f"/tasks?sort=priority&order=desc&limit=2&cursor={cursor}")
+
+        assert len(seen) == 5
+        assert len(set(seen)) == 5
+
+    def test_get_tasks_cursor_pagination_by_created_at(self):
+        ids = [client.post("/tasks", json={"title": f"Task {i + 1}"}).json()["id"] for i in range(5)]
+
+        def walk(order):
+            response = client.get(f"/tasks?sort=created_at&order={order}&limit=2")
+            seen = [task["id"] for task in response.json()]
+            while "X-Next-Cursor" in response.headers:
+                cursor = response.headers["X-Next-Cursor"]
+                response = client.get(f"/tasks?sort=created_at&order={order}&limit=2&cursor={cursor}")
+                seen.extend(task["id"] for task in response.json())
+                assert len(seen) <= len(ids)
+            return seen
+
+        # Значения created_at, записанные самим приложением
+        assert walk("asc") == ids
+        assert walk("desc") == ids[::-1]
+
+        # Несколько задач с одинаковым created_at (целые секунды)
+        with TestingSessionLocal() as db:
+            for task_id in ids[:3]:
+                db.get(Task, task_id).created_at = datetime(2025, 1, 1, 12, 0, 0)
+            for task_id in ids[3:]:
+                db.get(Task, task_id).created_at = datetime(2025, 1, 1, 12, 0, 1)
+            db.commit()
+
+        assert walk("asc") == ids
+        assert walk("desc") == ids[::-1]
+
+    def test_get_tasks_cursor_pagination_with_null_due_date(self):
+        client.post("/tasks", json={"title": "No deadline"})
+        client.post("/tasks", json={"title": "Deadline 1", "due_date": "2025-01-01T00:00:00"})
+        client.post("/tasks", json={"title": "Deadline 2", "due_date": "2025-02-01T00:00:00"})
+
+        for order in ("asc", "desc"):
+            response = client.get(f"/tasks?sort=due_date&order={order}&limit=1")
+            titles = [response.json()[0]["title"]]
+            while "X-Next-Cursor" in response.headers:
+                cursor = response.headers["X-Next-Cursor"]
+                response = client.get(f"/tasks?sort=due_date&order={order}&limit=1&cursor={cursor}")
+                titles.extend(task["title"] for task in response.json())
+
+            assert sorted(titles) == ["Deadline 1", "Deadline 2", "No deadline"]
+
+    def test_get_tasks_invalid_cursor(self):
+        response = client.get("/tasks?cursor=not-a-cursor")
+        assert response.status_code == 400
+        assert "cursor" in response.json()["detail"].lower()
+
+        # Курсор с корректным JSON, но неподходящими типами значений
+        payloads = [
+            ("priority", {"v": {"a": 1}, "id": 1}),
+            ("priority", {"v": "high", "id": 1}),
+            ("priority", {"v": True, "id": 1}),
+            ("created_at", {"v": 5, "id": 1}),
+            ("created_at", {"v": "yesterday", "id": 1}),
+            ("due_date", {"v": None, "id": "1"}),
+            ("due_date", {"id": 1}),
+            ("priority", [1, 1]),
+            ("priority", {"v": 10 ** 30, "id": 1}),
+            ("priority", {"v": 1, "id": 10 ** 30}),
+        ]
+        for sort, payload in payloads:
+            cursor = base64.urlsafe_b64encode(json.dumps(payload).encode()).decode()
+            response = client.get(f"/tasks?sort={sort}&cursor={cursor}")
+            assert response.status_code == 400, payload
+            assert "cursor" in response.json()["detail"].lower()
+
+    def test_get_tasks_total_count_header(self):
+        client.post("/tasks", json={"title": "Done task", "is_done": True})
+        client.post("/tasks", json={"title": "Pending task 1"})
+        client.post("/tasks", json={"title": "Pending task 2"})
+
+        response = client.get("/tasks?is_done=false&limit=1")
+        assert response.headers["X-Total-Count"] == "2"
+
+        response = client.get("/tasks")
+        assert response.headers["X-Total-Count"] == "3"
+
+    def test_get_tasks_total_count_cached_for_next_pages(self, monkeypatch):
+        monkeypatch.setattr(app_orm, "COUNT_CACHE_MIN_ROWS", 1)
+        monkeypatch.setattr(app_orm, "_count_cache", {})
+        client.post("/tasks", json={"title": "Task 1"})
+        client.post("/tasks", json={"title": "Task 2"})
+
+        assert client.get("/tasks?limit=1").headers["X-Total-Count"] == "2"
+        client.post("/tasks", json={"title": "Task 3"})
+
+        # Следующие страницы берут значение из кэша, первая - пересчитывает
+        assert client.get("/tasks?limit=1&offset=1").headers["X-Total-Count"] == "2"
+        assert client.get("/tasks?limit=1").headers["X-Total-Count"] == "3"
+
+    def test_get_tasks_total_count_cache_is_bounded(self, monkeypatch):
+        monkeypatch.setattr(app_orm, "COUNT_CACHE_MIN_ROWS", 1)
+        monkeypatch.setattr(app_orm, "COUNT_CACHE_MAX_SIZE", 2)
+        monkeypatch.setattr(app_orm, "_count_cache", {})
+        client.post("/tasks", json={"title": "Task 1"})
+
+        for word in ("one", "two", "three", "task"):
+            client.get(f"/tasks?q=task {word}")
+        client.get("/tasks?q=task")
+        assert len(app_orm._count_cache) <= 2
+
+        # Устаревшие записи удаляются при следующей записи в кэш
+        monkeypatch.setattr(app_orm, "COUNT_CACHE_TTL", 0)
+        client.get("/tasks?priority=1")
+        assert list(app_orm._count_cache) == [(None, None, 1, None, None)]
+
+    def test_get_tasks_total_count_cache_thread_safe(self, monkeypatch, tmp_path):
+        monkeypatch.setattr(app_orm, "COUNT_CACHE_MIN_ROWS", 0)
+        monkeypatch.setattr(app_orm, "COUNT_CACHE_MAX_SIZE", 256)
+        monkeypatch.setattr(app_orm, "_count_cache", {})
+
+        # Отдельная файловая база: у каждого потока свое соединение
+        thread_engine = create_engine(f"sqlite:///{tmp_path / 'threads.db'}", connect_args={"check_same_thread": False})
+        Base.metadata.create_all(bind=thread_engine)
+        ThreadSession = sessionmaker(bind=thread_engine)
+        barrier = threading.Barrier(16)
+        errors = []
+
+        def worker(n):
+            barrier.wait()
+            with ThreadSession() as db:
+                for i in range(200):
+                    due_before = datetime(2025, 1, 1) + timedelta(minutes=n * 1000 + i)
+                    try:
+                        app_orm.cached_count(db, (None, None, None, due_before, None), use_cache=True)
+                    except Exception as e:
+                        errors.append(e)
+
+        # Частое переключение потоков, чтобы гонки проявлялись стабильно
+        switch_interval = sys.getswitchinterval()
+        sys.setswitchinterval(1e-6)
+        try:
+            threads = [threading.Thread(target=worker, args=(n,)) for n in range(16)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+        finally:
+            sys.setswitchinterval(switch_interval)
+            thread_engine.dispose()
+
+        assert errors == []
+        assert len(app_orm._count_cache) <= 256
+
+    def test_filtered_queries_use_composite_indexes(self):
+        with engine.connect() as connection:
+            for column, index in (("is_done", "ix_tasks_done_created"), ("priority", "ix_tasks_priority_created")):
+                plan = connection.execute(text(
+                    f"EXPLAIN QUERY PLAN SELECT * FROM tasks WHERE {column} = 1 "
+                    "ORDER BY created_at DESC, id DESC LIMIT 10"
+                )).all()
+                details = " ".join(row[-1] for row in plan)
+                assert index in details
+                assert "TEMP B-TREE" not in details
+
+    def test_list_endpoints_query_count_is_bounded(self, sql_statements):
+        # Число запросов не должно расти вместе с числом задач (N+1)
+        counts = []
+        for batch in (2, 8):
+            for i in range(batch):
+                client.post("/tasks", json={"title": f"Task {i}", "details": "Details"})
+
+            for url in ("/tasks?limit=100", "/tasks?limit=100&include=details", "/tasks-page"):
+                sql_statements.clear()
+                assert client.get(url).status_code == 200
+                counts.append((url, len(sql_statements)))
+
+        assert counts[:3] == counts[3:]
+        assert all(count <= 2 for _, count in counts)
+
     def test_get_tasks_invalid_sort_parameter(self):
         response = client.get("/tasks?sort=invalid_field")
-        assert response.status_code == 400
+        assert response.status_code == 422  # FastAPI validation error
         data = response.json()
         assert "detail" in data
-        assert "sort" in data["detail"].lower()
+        assert data["detail"][0]["loc"] == ["query", "sort"]
 
     def test_get_tasks_invalid_order_parameter(self):
         response = client.get("/tasks?order=invalid_direction")
-        assert response.status_code == 400
+        assert response.status_code == 422  # FastAPI validation error
         data = response.json()
         assert "detail" in data
-        assert "order" in data["detail"].lower()
+        assert data["detail"][0]["loc"] == ["query", "order"]
 
 
 class TestGetTaskById:
@@ -314,6 +617,29 @@ class TestUpdateTask:
         assert data["details"] == created_task["details"]
         assert data["due_date"] == created_task["due_date"]
 
+    def test_update_task_single_round_trip(self, created_task, sql_statements):
+        response = client.put(f"/tasks/{created_task['id']}", json={"is_done": True})
+        assert response.status_code == 200
+        assert response.json()["is_done"] == True
+
+        # UPDATE ... RETURNING без предварительного SELECT
+        assert len(sql_statements) == 1
+        assert sql_statements[0].startswith("UPDATE tasks")
+
+    def test_update_task_null_is_done(self, created_task):
+        task_id = created_task["id"]
+        client.put(f"/tasks/{task_id}", json={"is_done": True})
+
+        # Явный null не нарушает NOT NULL и не меняет статус
+        response = client.put(f"/tasks/{task_id}", json={"is_done": None})
+        assert response.status_code == 200
+        assert response.json()["is_done"] == True
+
+        response = client.put(f"/tasks/{task_id}", json={"is_done": None, "title": "Updated title"})
+        assert response.status_code == 200
+        assert response.json()["is_done"] == True
+        assert response.json()["title"] == "Updated title"
+
     def test_update_nonexistent_task(self):
         response = client.put("/tasks/9999", json={"title": "Updated"})
         assert response.status_code == 404
@@ -366,5 +692,55 @@ class TestDeleteTask:
         assert response.status_code == 404
 
 
+class TestLegacyMigration:
+    """Тесты для переноса таблицы tasks со старой схемой (строковые даты)"""
+
+    LEGACY_SCHEMA = (
+        "CREATE TABLE tasks (id INTEGER NOT NULL, title VARCHAR NOT NULL, details VARCHAR, "
+        "is_done INTEGER, priority INTEGER, due_date VARCHAR, created_at VARCHAR NOT NULL, "
+        "updated_at VARCHAR, PRIMARY KEY (id))"
+    )
+
+    def test_legacy_table_is_rebuilt(self):
+        legacy_engine = create_engine("sqlite://", poolclass=StaticPool)
+        with legacy_engine.begin() as connection:
+            connection.exec_driver_sql(self.LEGACY_SCHEMA)
+            connection.exec_driver_sql("CREATE INDEX ix_tasks_id ON tasks (id)")
+            connection.exec_driver_sql(
+                "INSERT INTO tasks VALUES "
+                "(1, 'Buy milk', 'Go to supermarket', 1, 2, '2025-01-02', '2024-12-01T10:00:00.5', NULL), "
+                "(2, 'Read book', NULL, 0, 1, '2025-01-01T23:00:00Z', '2024-12-01T11:00:00', "
+                "'2024-12-02T09:30:00+03:00'), "
+                "(3, 'Learn Python', NULL, NULL, 3, NULL, '2024-12-01 12:00:00', NULL)"
+            )
+
+        with legacy_engine.begin() as connection:
+            app_orm.migrate_legacy_tasks(connection)
+
+        with sessionmaker(bind=legacy_engine)() as db:
+            tasks = {task.id: task for task in db.query(Task).all()}
+            assert tasks[1].is_done is True
+            assert tasks[3].is_done is False
+            assert tasks[1].due_date == datetime(2025, 1, 2)
+            assert tasks[2].due_date == datetime(2025, 1, 1, 23, 0, 0)
+            assert tasks[1].created_at == datetime(2024, 12, 1, 10, 0, 0, 500000)
+            assert tasks[2].updated_at == datetime(2024, 12, 2, 6, 30, 0)
+
+            # Сравнение с привязанными параметрами работает для всех старых форматов
+            due = db.query(Task.id).filter(Task.due_date >= datetime(2025, 1, 2)).all()
+            assert [row.id for row in due] == [1]
+            created = db.query(Task.id).filter(Task.created_at > datetime(2024, 12, 1, 10, 0, 0)).order_by(Task.id)
+            assert [row.id for row in created] == [1, 2, 3]
+
+            # Полнотекстовый индекс заполнен при переносе
+            found = db.execute(text("SELECT rowid FROM tasks_fts WHERE tasks_fts MATCH 'milk'")).all()
+            assert found == [(1,)]
+
+        # Повторный запуск на новой схеме ничего не меняет
+        with legacy_engine.begin() as connection:
+            app_orm.migrate_legacy_tasks(connection)
+            assert connection.exec_driver_sql("SELECT COUNT(*) FROM tasks").scalar() == 3
+
+
 if __name__ == "__main__":
     pytest.main([__file__, "-v"])
\ No newline at end of file